@@ -1,113 +1,571 @@
-"""Parse weight training data from activity descriptions.
-
-Supports formats like:
-- Hevy app exports: "Exercise Name\nSet 1: 175 lbs x 7\nSet 2: 175 lbs x 6"
-- Generic formats with weight and reps
-"""
-import re
-from typing import Dict, List, Optional, Tuple
-
-
-def parse_set_line(line: str) -> Optional[Tuple[float, int]]:
-    """Parse a single set line to extract weight and reps.
-    
-    Args:
-        line: A line like "Set 1: 175 lbs x 7" or "175 kg x 10"
-    
-    Returns:
-        Tuple of (weight_lbs, reps) or None if parsing fails
-    """
-    # Match patterns like "175 lbs x 7", "80 kg x 10", "175x7", etc.
-    # Also handles "[Failure]" or other annotations
-    pattern = r'(\d+(?:\.\d+)?)\s*(?:lbs?|pounds?|kg|kilograms?)?\s*[xX×]\s*(\d+)'
-    match = re.search(pattern, line)
-    
-    if not match:
-        return None
-    
-    weight = float(match.group(1))
-    reps = int(match.group(2))
-    
-    # Convert kg to lbs if needed
-    if 'kg' in line.lower() or 'kilogram' in line.lower():
-        weight = weight * 2.20462
-    
-    return (weight, reps)
-
-
-def parse_weight_training_description(description: str) -> Dict[str, float]:
-    """Parse weight training description to extract metrics.
-    
-    Args:
-        description: Activity description text, potentially containing workout data
-    
-    Returns:
-        Dict with keys:
-        - total_volume_lbs: Total weight × reps across all sets
-        - total_sets: Total number of sets performed
-        - total_reps: Total number of reps performed
-        - exercise_count: Number of unique exercises identified
-    """
-    if not description:
-        return {
-            'total_volume_lbs': 0.0,
-            'total_sets': 0,
-            'total_reps': 0,
-            'exercise_count': 0,
-        }
-    
-    lines = description.split('\n')
-    total_volume = 0.0
-    total_sets = 0
-    total_reps = 0
-    exercises = set()
-    current_exercise = None
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        # Try to parse as a set line
-        set_data = parse_set_line(line)
-        
-        if set_data:
-            weight, reps = set_data
-            total_volume += weight * reps
-            total_sets += 1
-            total_reps += reps
-            if current_exercise:
-                exercises.add(current_exercise)
-        else:
-            # Check if this looks like an exercise name
-            # Exercise names typically:
-            # - Don't start with "Set" or contain "x" with numbers
-            # - Are not just metadata like "Logged with Hevy"
-            # - Don't match common non-exercise patterns
-            if not re.search(r'\d+\s*[xX×]\s*\d+', line) and \
-               not line.lower().startswith('set ') and \
-               not line.lower().startswith('logged with') and \
-               not line.lower().startswith('rep ') and \
-               len(line) > 3:
-                # Likely an exercise name
-                current_exercise = line
-    
-    return {
-        'total_volume_lbs': round(total_volume, 2),
-        'total_sets': total_sets,
-        'total_reps': total_reps,
-        'exercise_count': len(exercises),
-    }
-
-
-def get_weight_training_metrics(activity: Dict) -> Dict[str, float]:
-    """Extract weight training metrics from an activity dict.
-    
-    Args:
-        activity: Activity dict that may contain a 'description' field
-    
-    Returns:
-        Dict with weight training metrics (all zeros if no description or not parseable)
-    """
-    description = activity.get('description', '') or ''
-    return parse_weight_training_description(description)
+"""Parse weight training data from activity descriptions.
+
+Supports formats like:
+- Hevy app exports: "Exercise Name\nSet 1: 175 lbs x 7\nSet 2: 175 lbs x 6"
+- Generic formats with weight and reps
+"""
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from numba import njit
+except ImportError:  # numba is an optional accelerator, not a requirement
+    njit = None
+
+try:
+    import hyperscan
+except ImportError:  # hyperscan is an optional accelerator, not a requirement
+    hyperscan = None
+
+_KG_TO_LBS = 2.20462
+
+# Matches patterns like "175 lbs x 7", "80 kg x 10", "175x7", etc.
+# Also handles "[Failure]" or other annotations. Compiled once at import
+# so the hot per-line path skips the re module's cache lookup. The unit
+# is captured (group 2, case-insensitive) so callers can detect kg from
+# the match instead of re-scanning a lowered copy of the line.
+_SET_RE = re.compile(r'(\d+(?:\.\d+)?)\s*((?i:lbs?|pounds?|kg|kilograms?))?\s*[xX×]\s*(\d+)')
+
+# When hyperscan is installed, a capture-free copy of the set pattern is
+# compiled into a streaming DFA used as a prefilter: descriptions with no
+# set anywhere (prose, race reports) skip the backtracking re pass
+# entirely. hyperscan has no capture groups, so extraction stays with re.
+_HS_DB = None
+if hyperscan is not None:
+    _HS_DB = hyperscan.Database()
+    _HS_DB.compile(
+        expressions=[
+            r'\d+(\.\d+)?\s*(lbs?|pounds?|kg|kilograms?)?\s*(?:[xX]|×)\s*\d+'.encode('utf-8'),
+        ],
+        ids=[0],
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8],
+    )
+
+# Unit tokens the hand-rolled scanner recognizes, longest first within
+# each leading letter so "kilograms" wins over "kg" etc.
+_UNIT_TOKENS = ('kilograms', 'kilogram', 'kg', 'pounds', 'pound', 'lbs', 'lb')
+
+# Metadata prefixes that rule a line out as an exercise name. Checked
+# with one tuple-form startswith against a bounded lowered slice.
+_META_PREFIXES = ('set ', 'logged with', 'rep ')
+
+# Non-blank line spans. Iterating these gives each line's text and offsets
+# in one scan (handling \r\n like splitlines) without building a list.
+_LINE_SPAN_RE = re.compile(r'[^\r\n]+')
+
+# Frozen result template. dict.copy() is a C-level clone that skips the
+# literal-construction machinery (key hashing, resize) on every call.
+_ZERO_METRICS = {
+    'total_volume_lbs': 0.0,
+    'total_sets': 0,
+    'total_reps': 0,
+    'exercise_count': 0,
+}
+
+# Separator for the batch path's joined buffer. \x01 is neither \s, a
+# digit, nor a unit letter, so the set pattern can never match across it.
+_ACTIVITY_BREAK = '\n\x01ACTIVITY_BREAK\x01\n'
+
+
+def parse_set_line(line: str) -> Optional[Tuple[float, int]]:
+    """Parse a single set line to extract weight and reps.
+
+    Args:
+        line: A line like "Set 1: 175 lbs x 7" or "175 kg x 10"
+
+    Returns:
+        Tuple of (weight_lbs, reps) or None if parsing fails
+    """
+    # Hand-rolled linear scan of the WEIGHT [unit] x REPS grammar. The
+    # grammar is simple enough that index arithmetic beats the regex
+    # engine, whose optional unit alternation forces backtracking.
+    n = len(line)
+    i = 0
+    while i < n:
+        # Find the next digit run (candidate weight)
+        while i < n and not '0' <= line[i] <= '9':
+            i += 1
+        if i >= n:
+            return None
+        start = i
+        while i < n and '0' <= line[i] <= '9':
+            i += 1
+        j = i
+        # Optional decimal part
+        if j + 1 < n and line[j] == '.' and '0' <= line[j + 1] <= '9':
+            j += 2
+            while j < n and '0' <= line[j] <= '9':
+                j += 1
+        weight_end = j
+        while j < n and line[j] in ' \t':
+            j += 1
+        # Optional unit token
+        unit_is_kg = False
+        if j < n and line[j] in 'lLpPkK':
+            for token in _UNIT_TOKENS:
+                if line[j:j + len(token)].lower() == token:
+                    unit_is_kg = token[0] == 'k'
+                    j += len(token)
+                    break
+            while j < n and line[j] in ' \t':
+                j += 1
+        # Required separator and reps run
+        if j < n and line[j] in 'xX×':
+            j += 1
+            while j < n and line[j] in ' \t':
+                j += 1
+            reps_start = j
+            while j < n and '0' <= line[j] <= '9':
+                j += 1
+            if j > reps_start:
+                weight = float(line[start:weight_end])
+                if unit_is_kg:
+                    weight = weight * _KG_TO_LBS
+                return (weight, int(line[reps_start:j]))
+        # This candidate didn't pan out; resume after its digit run
+
+    return None
+
+
+def _scan_sets(buf) -> Tuple[float, int, int]:
+    """Byte-level scan of a whole description for set totals.
+
+    Mirrors parse_set_line's grammar over a utf-8 buffer using only ints
+    and floats, so numba can compile it to native code when installed.
+    Exercise-name counting needs real strings and stays in Python.
+
+    Args:
+        buf: utf-8 encoded description bytes
+
+    Returns:
+        Tuple of (total_volume_lbs, total_sets, total_reps)
+    """
+    n = len(buf)
+    total_volume = 0.0
+    total_sets = 0
+    total_reps = 0
+    i = 0
+    while i < n:
+        # Find the next digit run (candidate weight)
+        while i < n and not 48 <= buf[i] <= 57:
+            i += 1
+        if i >= n:
+            break
+        weight = 0.0
+        while i < n and 48 <= buf[i] <= 57:
+            weight = weight * 10.0 + (buf[i] - 48)
+            i += 1
+        j = i
+        # Optional decimal part, parsed as integer/scale for exactness
+        if j + 1 < n and buf[j] == 46 and 48 <= buf[j + 1] <= 57:
+            j += 1
+            frac = 0.0
+            scale = 1.0
+            while j < n and 48 <= buf[j] <= 57:
+                frac = frac * 10.0 + (buf[j] - 48)
+                scale = scale * 10.0
+                j += 1
+            weight = weight + frac / scale
+        while j < n and (buf[j] == 32 or 9 <= buf[j] <= 13):
+            j += 1
+        # Optional unit token (byte comparisons, |0x20 lowercases ASCII)
+        unit_is_kg = False
+        if j < n:
+            c = buf[j] | 0x20
+            if c == 107:  # k
+                if j + 1 < n and (buf[j + 1] | 0x20) == 103:  # "kg"
+                    unit_is_kg = True
+                    j += 2
+                elif (j + 7 < n
+                      and (buf[j + 1] | 0x20) == 105   # i
+                      and (buf[j + 2] | 0x20) == 108   # l
+                      and (buf[j + 3] | 0x20) == 111   # o
+                      and (buf[j + 4] | 0x20) == 103   # g
+                      and (buf[j + 5] | 0x20) == 114   # r
+                      and (buf[j + 6] | 0x20) == 97    # a
+                      and (buf[j + 7] | 0x20) == 109):  # "kilogram"
+                    unit_is_kg = True
+                    j += 8
+                    if j < n and (buf[j] | 0x20) == 115:  # optional s
+                        j += 1
+            elif c == 108:  # l
+                if j + 1 < n and (buf[j + 1] | 0x20) == 98:  # "lb"
+                    j += 2
+                    if j < n and (buf[j] | 0x20) == 115:
+                        j += 1
+            elif c == 112:  # p
+                if (j + 4 < n
+                        and (buf[j + 1] | 0x20) == 111   # o
+                        and (buf[j + 2] | 0x20) == 117   # u
+                        and (buf[j + 3] | 0x20) == 110   # n
+                        and (buf[j + 4] | 0x20) == 100):  # "pound"
+                    j += 5
+                    if j < n and (buf[j] | 0x20) == 115:
+                        j += 1
+        while j < n and (buf[j] == 32 or 9 <= buf[j] <= 13):
+            j += 1
+        # Required separator: x, X, or utf-8 '×' (0xc3 0x97)
+        has_sep = False
+        if j < n:
+            if buf[j] == 120 or buf[j] == 88:
+                j += 1
+                has_sep = True
+            elif buf[j] == 0xc3 and j + 1 < n and buf[j + 1] == 0x97:
+                j += 2
+                has_sep = True
+        if has_sep:
+            while j < n and (buf[j] == 32 or 9 <= buf[j] <= 13):
+                j += 1
+            reps = 0
+            digits = 0
+            while j < n and 48 <= buf[j] <= 57:
+                reps = reps * 10 + (buf[j] - 48)
+                j += 1
+                digits += 1
+            if digits > 0:
+                if unit_is_kg:
+                    weight = weight * _KG_TO_LBS
+                total_volume += weight * reps
+                total_sets += 1
+                total_reps += reps
+                i = j
+        # Otherwise resume scanning after this candidate's digit run
+
+    return (total_volume, total_sets, total_reps)
+
+
+if njit is not None:
+    _scan_sets = njit(cache=True)(_scan_sets)
+
+
+def _contains_set(description: str) -> bool:
+    """Prefilter: does the description contain any set-like token?
+
+    Only called when hyperscan is available. The scan halts on the first
+    hit, so prose-only descriptions pay a single linear DFA pass and
+    everything else falls through to the full parse.
+    """
+    hits = []
+
+    def _on_match(pattern_id, start, end, flags, context):
+        hits.append(end)
+        return 1  # halt the scan at the first hit
+
+    try:
+        _HS_DB.scan(description.encode('utf-8'), match_event_handler=_on_match)
+    except hyperscan.ScanTerminated:
+        pass
+    return bool(hits)
+
+
+def _count_exercises(description: str) -> int:
+    """Count distinct exercise names that have at least one set.
+
+    Python-side companion to _scan_sets, which handles only numeric
+    totals. Uses the same classification rules as _aggregate_sets, but
+    strictly per line: a set that somehow spans a line break is not
+    treated as a set line here. Real set lines never wrap, so the two
+    paths agree on actual workout text.
+    """
+    exercise_count = 0
+    last_counted_exercise = None
+    current_exercise = None
+    for line in description.splitlines():
+        if not line or line.isspace():
+            continue
+        if line[0].isspace() or line[-1].isspace():
+            line = line.strip()
+        if parse_set_line(line) is not None:
+            if current_exercise is not None and \
+               current_exercise is not last_counted_exercise:
+                exercise_count += 1
+                last_counted_exercise = current_exercise
+        elif not line[:12].lower().startswith(_META_PREFIXES) and \
+                len(line) > 3:
+            current_exercise = sys.intern(line)
+    return exercise_count
+
+
+def _aggregate_sets(description: str, set_matches, base: int = 0) -> Tuple[float, int, int, int]:
+    """Aggregate set matches against the description's lines.
+
+    Args:
+        description: Text whose lines are walked for exercise attribution
+        set_matches: Iterable of _SET_RE matches found in that text
+        base: Offset of description within the buffer the matches came
+            from (nonzero on the batch path, which scans a joined buffer)
+
+    Returns:
+        Tuple of (total_volume, total_sets, total_reps, exercise_count)
+    """
+    # Whole-number lbs weights (the common Hevy case) accumulate through
+    # fast small-int arithmetic; floats are only touched for decimal
+    # weights and kg conversions.
+    total_int_volume = 0
+    total_float_volume = 0.0
+    total_sets = 0
+    total_reps = 0
+    # Names almost never repeat non-consecutively within one description,
+    # so distinct exercises are counted on transitions instead of being
+    # accumulated in a hash set. Identity comparison suffices because the
+    # current name is promoted (and interned) once per name line.
+    exercise_count = 0
+    last_counted_exercise = None
+    current_exercise = None
+
+    matches = iter(set_matches)
+    match = next(matches, None)
+
+    for line_match in _LINE_SPAN_RE.finditer(description):
+        line_end = line_match.end() + base
+
+        # Consume every set match that starts on this line
+        line_has_set = False
+        while match is not None and match.start() < line_end:
+            # One group() call fetches all three captures in a single
+            # C/Python boundary crossing
+            weight_str, unit, reps_str = match.group(1, 2, 3)
+            reps = int(reps_str)
+            if unit and unit[0] in ('k', 'K'):
+                total_float_volume += float(weight_str) * _KG_TO_LBS * reps
+            elif '.' in weight_str:
+                total_float_volume += float(weight_str) * reps
+            else:
+                total_int_volume += int(weight_str) * reps
+            total_sets += 1
+            total_reps += reps
+            if current_exercise is not None and \
+               current_exercise is not last_counted_exercise:
+                exercise_count += 1
+                last_counted_exercise = current_exercise
+            line_has_set = True
+            match = next(matches, None)
+
+        if line_has_set:
+            continue
+
+        line = line_match.group()
+        if line.isspace():
+            continue
+        # Only pay for a stripped copy when the line actually has
+        # surrounding whitespace; most lines don't.
+        if line[0].isspace() or line[-1].isspace():
+            line = line.strip()
+
+        # Check if this looks like an exercise name
+        # Exercise names typically:
+        # - Are not just metadata like "Logged with Hevy"
+        # - Don't match common non-exercise patterns
+        # A loose "numbers x numbers" recheck is unnecessary here: any
+        # line containing one would already have produced a set match.
+        if not line[:12].lower().startswith(_META_PREFIXES) and \
+           len(line) > 3:
+            # Likely an exercise name. Interned so repeated names across
+            # many workouts share one string and compare by pointer.
+            current_exercise = sys.intern(line)
+
+    return (total_int_volume + total_float_volume, total_sets, total_reps,
+            exercise_count)
+
+
+def _parse_hevy_fast(description: str) -> Optional[Tuple[float, int, int, int]]:
+    """Specialized parser for canonical Hevy exports.
+
+    Hevy descriptions are blank-line-separated blocks of an exercise name
+    followed by lines of exactly "Set N: W lbs x R", optionally suffixed
+    with "[Failure]". For that shape, splitting on whitespace and
+    indexing tokens beats scanning. Returns None on the first line that
+    deviates, and the caller falls back to the generic parser.
+
+    Returns:
+        Tuple of (total_volume, total_sets, total_reps, exercise_count),
+        or None when the description isn't canonical Hevy
+    """
+    total_int_volume = 0
+    total_float_volume = 0.0
+    total_sets = 0
+    total_reps = 0
+    exercise_count = 0
+    last_counted_exercise = None
+    current_exercise = None
+
+    for line in description.splitlines():
+        if not line or line.isspace():
+            continue
+        if line[0].isspace() or line[-1].isspace():
+            line = line.strip()
+
+        if line.startswith('Set '):
+            tokens = line.split()
+            if not (6 <= len(tokens) <= 7
+                    and tokens[1].endswith(':')
+                    and tokens[1][:-1].isdigit()
+                    and tokens[3] == 'lbs'
+                    and tokens[4] in ('x', 'X')
+                    and tokens[5].isdigit()
+                    and (len(tokens) == 6 or tokens[6] == '[Failure]')):
+                return None
+            weight_str = tokens[2]
+            reps = int(tokens[5])
+            if weight_str.isdigit():
+                total_int_volume += int(weight_str) * reps
+            elif weight_str.replace('.', '', 1).isdigit():
+                total_float_volume += float(weight_str) * reps
+            else:
+                return None
+            total_sets += 1
+            total_reps += reps
+            if current_exercise is not None and \
+               current_exercise is not last_counted_exercise:
+                exercise_count += 1
+                last_counted_exercise = current_exercise
+        elif line == 'Logged with Hevy':
+            continue
+        else:
+            # Must be a plain exercise name; digits or metadata-like
+            # prefixes mean this isn't canonical Hevy after all
+            if len(line) <= 3 or line[:12].lower().startswith(_META_PREFIXES):
+                return None
+            for c in line:
+                if '0' <= c <= '9':
+                    return None
+            current_exercise = sys.intern(line)
+
+    return (total_int_volume + total_float_volume, total_sets, total_reps,
+            exercise_count)
+
+
+def parse_weight_training_description(description: str,
+                                      round_output: bool = True,
+                                      use_numba: bool = False) -> Dict[str, float]:
+    """Parse weight training description to extract metrics.
+
+    Args:
+        description: Activity description text, potentially containing workout data
+        round_output: Round total_volume_lbs to 2 decimals. Batch callers
+            summing many activities can pass False and round once at the end.
+        use_numba: Route set totals through the byte-level _scan_sets core,
+            which runs as native code when numba is installed (and as plain
+            Python otherwise). Worth enabling for bulk ingest of years of
+            history; the default path needs no optional dependency.
+
+    Returns:
+        Dict with keys:
+        - total_volume_lbs: Total weight × reps across all sets
+        - total_sets: Total number of sets performed
+        - total_reps: Total number of reps performed
+        - exercise_count: Number of unique exercises identified
+    """
+    if not description:
+        return _ZERO_METRICS.copy()
+
+    # A description with no set anywhere yields all-zero metrics
+    # (exercises only count once a set lands under them), so the DFA
+    # prefilter can answer outright for prose-only text.
+    if _HS_DB is not None and not _contains_set(description):
+        return _ZERO_METRICS.copy()
+
+    if use_numba:
+        total_volume, total_sets, total_reps = _scan_sets(
+            description.encode('utf-8'))
+        exercise_count = _count_exercises(description)
+    else:
+        # Descriptions that announce themselves as Hevy exports get the
+        # specialized token parser; anything it can't vouch for falls
+        # back to the generic scan.
+        totals = None
+        first_line = _LINE_SPAN_RE.search(description)
+        if first_line is not None and \
+           first_line.group().strip() == 'Logged with Hevy':
+            totals = _parse_hevy_fast(description)
+        if totals is None:
+            # Run the set pattern once over the whole description; the
+            # regex engine stays in C between matches instead of being
+            # re-entered per line.
+            totals = _aggregate_sets(description, _SET_RE.finditer(description))
+        total_volume, total_sets, total_reps, exercise_count = totals
+
+    out = _ZERO_METRICS.copy()
+    out['total_volume_lbs'] = round(total_volume, 2) if round_output else total_volume
+    out['total_sets'] = total_sets
+    out['total_reps'] = total_reps
+    out['exercise_count'] = exercise_count
+    return out
+
+
+def parse_weight_training_description_into(description: str, out, row: int) -> None:
+    """Parse a description and write its metrics into a preallocated row.
+
+    Structure-of-arrays companion to parse_weight_training_description
+    for callers aggregating thousands of activities: fill one
+    (n_activities, 4) buffer, then reduce it with a single vectorized
+    sum instead of unpacking a dict per activity.
+
+    Args:
+        description: Activity description text
+        out: 2-D indexable buffer, e.g. np.zeros((n_activities, 4));
+            columns are (volume_lbs, sets, reps, exercise_count)
+        row: Row index to write
+
+    The volume column is left unrounded so column sums stay exact;
+    round once after reducing.
+    """
+    metrics = parse_weight_training_description(description, round_output=False)
+    out[row][0] = metrics['total_volume_lbs']
+    out[row][1] = metrics['total_sets']
+    out[row][2] = metrics['total_reps']
+    out[row][3] = metrics['exercise_count']
+
+
+def get_weight_training_metrics_batch(activities: List[Dict]) -> List[Dict[str, float]]:
+    """Extract weight training metrics for many activities in one scan.
+
+    Joins all descriptions with a sentinel the set pattern cannot match
+    across and runs the compiled pattern once over the combined buffer,
+    so the regex engine streams through N activities instead of being
+    set up and torn down N times.
+
+    Args:
+        activities: List of activity dicts that may contain a 'description' field
+
+    Returns:
+        List of metric dicts (same shape as get_weight_training_metrics),
+        one per activity, in input order
+    """
+    descriptions = [(activity.get('description', '') or '') for activity in activities]
+    joined = _ACTIVITY_BREAK.join(descriptions)
+    matches = _SET_RE.finditer(joined)
+    match = next(matches, None)
+
+    results = []
+    base = 0
+    for description in descriptions:
+        end = base + len(description)
+        segment_matches = []
+        while match is not None and match.start() < end:
+            segment_matches.append(match)
+            match = next(matches, None)
+        total_volume, total_sets, total_reps, exercise_count = _aggregate_sets(
+            description, segment_matches, base)
+        out = _ZERO_METRICS.copy()
+        out['total_volume_lbs'] = round(total_volume, 2)
+        out['total_sets'] = total_sets
+        out['total_reps'] = total_reps
+        out['exercise_count'] = exercise_count
+        results.append(out)
+        base = end + len(_ACTIVITY_BREAK)
+    return results
+
+
+def get_weight_training_metrics(activity: Dict) -> Dict[str, float]:
+    """Extract weight training metrics from an activity dict.
+    
+    Args:
+        activity: Activity dict that may contain a 'description' field
+    
+    Returns:
+        Dict with weight training metrics (all zeros if no description or not parseable)
+    """
+    description = activity.get('description', '') or ''
+    return parse_weight_training_description(description)
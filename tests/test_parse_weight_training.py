@@ -5,6 +5,8 @@ from scripts.parse_weight_training import (
     parse_set_line,
     parse_weight_training_description,
     get_weight_training_metrics,
+    get_weight_training_metrics_batch,
+    parse_weight_training_description_into,
 )
 
 
@@ -159,6 +161,59 @@ Set 1: 100 lbs x 5"""
         self.assertEqual(metrics['total_reps'], 10)
         self.assertEqual(metrics['exercise_count'], 2)
 
+    def test_hevy_header_with_kg_falls_back_to_generic(self):
+        """Test that non-canonical Hevy (kg units) still parses correctly."""
+        description = """Logged with Hevy
+
+Squat (Barbell)
+Set 1: 100 kg x 5
+Set 2: 100 kg x 5"""
+
+        metrics = parse_weight_training_description(description)
+
+        # 100 kg = 220.462 lbs; 220.462 * 5 * 2 = 2204.62
+        self.assertAlmostEqual(metrics['total_volume_lbs'], 2204.62, places=1)
+        self.assertEqual(metrics['total_sets'], 2)
+        self.assertEqual(metrics['total_reps'], 10)
+        self.assertEqual(metrics['exercise_count'], 1)
+
+    def test_scan_sets_core_matches_default_path(self):
+        """Test that the byte-level core agrees with the regex path."""
+        description = """Logged with Hevy
+
+Chest Press (Machine)
+Set 1: 175 lbs x 7
+Set 2: 62.5 lbs x 6
+
+Squat (Barbell)
+Set 1: 100 kg x 5
+Set 2: 100 KG x 5"""
+
+        default = parse_weight_training_description(description)
+        native = parse_weight_training_description(description, use_numba=True)
+
+        self.assertEqual(native, default)
+
+    def test_unrounded_output(self):
+        """Test that round_output=False defers rounding to the caller."""
+        description = "Exercise A\nSet 1: 100 kg x 5"
+
+        metrics = parse_weight_training_description(description, round_output=False)
+
+        # Raw value: 100 * 2.20462 * 5 = 1102.31 exactly after rounding
+        self.assertAlmostEqual(metrics['total_volume_lbs'], 1102.31, places=6)
+        self.assertEqual(round(metrics['total_volume_lbs'], 2), 1102.31)
+
+    def test_windows_line_endings(self):
+        """Test that CRLF line endings don't leak \\r into exercise names."""
+        description = "Bench Press\r\nSet 1: 135 lbs x 10\r\nSet 2: 135 lbs x 10\r\n"
+
+        metrics = parse_weight_training_description(description)
+
+        self.assertEqual(metrics['total_volume_lbs'], 2700.0)
+        self.assertEqual(metrics['total_sets'], 2)
+        self.assertEqual(metrics['exercise_count'], 1)
+
     def test_no_exercise_names(self):
         """Test parsing sets without exercise names."""
         description = """Set 1: 100 lbs x 10
@@ -199,10 +254,51 @@ Set 2: 100 lbs x 10"""
     def test_activity_with_empty_description(self):
         """Test extracting metrics from activity with empty description."""
         activity = {'description': ''}
-        
+
         metrics = get_weight_training_metrics(activity)
         self.assertEqual(metrics['total_volume_lbs'], 0.0)
 
 
+class TestGetWeightTrainingMetricsBatch(unittest.TestCase):
+    """Test the single-scan batch path."""
+
+    def test_batch_matches_per_activity_results(self):
+        """Test that batch results equal per-activity results."""
+        activities = [
+            {'description': "Bench Press\nSet 1: 135 lbs x 10\nSet 2: 135 lbs x 8"},
+            {'description': ''},
+            {'name': 'No description'},
+            {'description': "Squat\nSet 1: 100 kg x 5\nDeadlift\nSet 1: 140 kg x 3"},
+        ]
+
+        batch = get_weight_training_metrics_batch(activities)
+
+        self.assertEqual(len(batch), len(activities))
+        for activity, metrics in zip(activities, batch):
+            self.assertEqual(metrics, get_weight_training_metrics(activity))
+
+    def test_batch_empty_list(self):
+        """Test that an empty activity list yields an empty result."""
+        self.assertEqual(get_weight_training_metrics_batch([]), [])
+
+    def test_parse_into_preallocated_rows(self):
+        """Test writing metrics into a preallocated row buffer."""
+        descriptions = [
+            "Bench Press\nSet 1: 135 lbs x 10",
+            "",
+            "Squat\nSet 1: 100 kg x 5\nSet 2: 100 kg x 5",
+        ]
+        out = [[0.0] * 4 for _ in descriptions]
+
+        for row, description in enumerate(descriptions):
+            parse_weight_training_description_into(description, out, row)
+
+        self.assertEqual(out[0], [1350.0, 1, 10, 1])
+        self.assertEqual(out[1], [0.0, 0, 0, 0])
+        # Volume column is unrounded; round after reducing
+        self.assertAlmostEqual(out[2][0], 2204.62, places=1)
+        self.assertEqual(out[2][1:], [2, 10, 1])
+
+
 if __name__ == '__main__':
     unittest.main()